@@ -6,6 +6,7 @@ DeforMA - alert_rtk (workpool writer)
 - Source 1 Hz base files:  ~/DeforMA/database/<BASELINE>.RTK
 - Output 1-min daily:      ~/DeforMA/workpool/alert_rtk/daily/<BASELINE>/<BASELINE>_YYDOY.RTK
 - Log:                     ~/DeforMA/workpool/alert_rtk/log/alert_rtk.log
+- Run state:               ~/DeforMA/workpool/alert_rtk/state/<BASELINE>.json
 - Baselines list:          ~/DeforMA/metadata/baselines.yaml
 
 Env overrides:
@@ -19,14 +20,18 @@ Typical cron (every 10 min):
 
 from __future__ import annotations
 import argparse
+import atexit
 import io
 import gzip
+import json
+import math
 import os
 import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Tuple, Optional
-import yaml
 
 # ====================== Paths & logging ======================
 
@@ -48,12 +53,21 @@ WORKPOOL_DIR   = Path(os.environ.get("DEFORMA_WORKPOOL_DIR") or _default_workpoo
 OUT_DAILY_ROOT = WORKPOOL_DIR / "alert_rtk" / "daily"   # per-baseline subfolders inside
 LOG_DIR        = WORKPOOL_DIR / "alert_rtk" / "log"
 LOG_PATH       = LOG_DIR / "alert_rtk.log"
+STATE_DIR      = WORKPOOL_DIR / "alert_rtk" / "state"   # what was seen of each base file last run
+
+_LOG_BUF: List[str] = []   # lines are buffered and appended in one write by _flush_log()
 
 def _log(msg: str) -> None:
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
     ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    _LOG_BUF.append(f"[{ts}] {msg.rstrip()}\n")
+
+def _flush_log() -> None:
+    if not _LOG_BUF:
+        return
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
     with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {msg.rstrip()}\n")
+        f.write("".join(_LOG_BUF))
+    _LOG_BUF.clear()
 
 # ====================== Helpers ==============================
 
@@ -62,7 +76,9 @@ def _load_baselines_from_yaml(p: Path) -> List[str]:
         _log(f"[warn] baselines.yaml not found: {p}")
         return []
     try:
-        data = yaml.safe_load(p.read_text(encoding="utf-8")) or {}
+        import yaml  # only needed when --baselines is not given
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml when available
+        data = yaml.load(p.read_text(encoding="utf-8"), Loader=loader) or {}
     except Exception as e:
         _log(f"[warn] cannot read baselines.yaml: {e}")
         return []
@@ -76,16 +92,21 @@ def _load_baselines_from_yaml(p: Path) -> List[str]:
     out = [b for b in out if not (b in seen or seen.add(b))]
     return out
 
-def _safe_copy(src: Path, dst: Path) -> bool:
+def _load_state(baseline: str) -> dict:
     try:
-        if not src.exists():
-            return False
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(src, dst)
-        return True
+        return json.loads((STATE_DIR / f"{baseline}.json").read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def _save_state(baseline: str, state: dict) -> None:
+    try:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        p = STATE_DIR / f"{baseline}.json"
+        tmp = p.with_name(f".{p.name}.tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, p)
     except Exception as e:
-        _log(f"[warn] copy failed {src} -> {dst}: {e}")
-        return False
+        _log(f"[warn] cannot save state for {baseline}: {e}")
 
 def _open_text_any(path: Path) -> io.TextIOBase:
     if str(path).lower().endswith(".gz"):
@@ -93,7 +114,11 @@ def _open_text_any(path: Path) -> io.TextIOBase:
     return open(path, "r", encoding="utf-8", errors="ignore")
 
 def _yy_doy(dt: datetime) -> Tuple[int,int]:
-    return dt.year % 100, int(dt.strftime("%j"))
+    return dt.year % 100, dt.timetuple().tm_yday
+
+def _ts_str(dt: datetime) -> str:
+    # "yyyy/MM/dd HH:mm:ss", same as strftime('%Y/%m/%d %H:%M:%S') without the format parsing
+    return f"{dt.year:04d}/{dt.month:02d}/{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
 
 def _daily_file_name(baseline: str, dt: datetime) -> str:
     yy, doy = _yy_doy(dt)
@@ -101,29 +126,43 @@ def _daily_file_name(baseline: str, dt: datetime) -> str:
 
 # ====================== Parsing & DS =========================
 
-def _parse_base_rtk(path: Path) -> List[Tuple[datetime, float, float, float, int]]:
+_MINUTE = timedelta(minutes=1)
+
+def _parse_base_rtk(path: Path, offset: int = 0
+                   ) -> Tuple[List[Tuple[datetime, float, float, float, int]], int]:
     """
-    Parse base 1 Hz RTK file (.RTK).
-    Skips first 2 header lines; each data line has fixed-width:
+    Parse base 1 Hz RTK file (.RTK), starting at byte `offset`.
+    Skips first 2 header lines (only when starting at 0); each data line has fixed-width:
       [0:19]  timestamp "yyyy/MM/dd HH:mm:ss"
       [24:38] East (m)
       [39:53] North (m)
       [54:68] Up (m)
       [71:72] Quality (single char/int)
-    Returns: list of (dt, E, N, U, q)
+    A trailing line without newline is still being written and is left for later.
+    Returns: (list of (dt, E, N, U, q), resume offset), the resume offset being
+    where the last minute starts, since that minute may not be complete yet.
     """
     out: List[Tuple[datetime, float, float, float, int]] = []
-    if not path.exists():
-        return out
     try:
-        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+        with open(path, "rb") as f:
+            f.seek(offset)
+            raw = f.read()
     except Exception as e:
         _log(f"[warn] failed reading {path}: {e}")
-        return out
-    if len(lines) <= 2:
-        return out
-
-    for line in lines[2:]:
+        return out, offset
+
+    end = raw.rfind(b"\n") + 1
+    resume = offset + end
+    cur_minute = cur_end = None
+    pos = 0
+    skip = 2 if offset == 0 else 0
+    while pos < end:
+        start = pos
+        pos = raw.index(b"\n", start) + 1
+        if skip:
+            skip -= 1
+            continue
+        line = raw[start:pos].decode("utf-8", errors="ignore").rstrip("\r\n")
         if len(line) < 72:
             continue
         ts = line[0:19].strip()
@@ -131,16 +170,21 @@ def _parse_base_rtk(path: Path) -> List[Tuple[datetime, float, float, float, int
         ns = line[39:53].strip()
         us = line[54:68].strip()
         qs = line[71:72].strip()
-        # tolerant parse
+        # fixed columns straight into datetime (strptime re-parses the format string
+        # on every one of the 86400 lines a day); tolerant parse as fallback
         try:
-            dt = datetime.strptime(ts, "%Y/%m/%d %H:%M:%S")
+            dt = datetime(int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                          int(ts[11:13]), int(ts[14:16]), int(ts[17:19]))
         except Exception:
             try:
-                y, M, d = ts[0:4], ts[5:7].lstrip("/"), ts[8:10].lstrip("/")
-                h, m, s = ts[11:13], ts[14:16], ts[17:19]
-                dt = datetime(int(y), int(M), int(d), int(h), int(m), int(s))
+                dt = datetime.strptime(ts, "%Y/%m/%d %H:%M:%S")
             except Exception:
-                continue
+                try:
+                    y, M, d = ts[0:4], ts[5:7].lstrip("/"), ts[8:10].lstrip("/")
+                    h, m, s = ts[11:13], ts[14:16], ts[17:19]
+                    dt = datetime(int(y), int(M), int(d), int(h), int(m), int(s))
+                except Exception:
+                    continue
         try:
             E = float(es); N = float(ns); U = float(us)
         except Exception:
@@ -149,8 +193,11 @@ def _parse_base_rtk(path: Path) -> List[Tuple[datetime, float, float, float, int
             q = int(qs) if qs else 0
         except Exception:
             q = 0
+        if cur_minute is None or not (cur_minute <= dt < cur_end):
+            cur_minute, resume = dt.replace(second=0), offset + start
+            cur_end = cur_minute + _MINUTE
         out.append((dt, E, N, U, q))
-    return out
+    return out, resume
 
 def _downsample_1min(samples: List[Tuple[datetime,float,float,float,int]],
                      method: str = "mean"
@@ -160,28 +207,37 @@ def _downsample_1min(samples: List[Tuple[datetime,float,float,float,int]],
     Returns dict { minute_dt : (E, N, U, q) }.
     q aggregated as max (conservative).
     """
-    from statistics import mean, median
-    buckets: Dict[datetime, List[Tuple[float,float,float,int]]] = {}
+    from statistics import median
+    # one list per component, filled directly (no per-sample tuple, no re-split later)
+    buckets: Dict[datetime, Tuple[List[float],List[float],List[float],List[int]]] = defaultdict(lambda: ([], [], [], []))
+    last_key = last_end = None
     for dt, E, N, U, q in samples:
-        minute_dt = dt.replace(second=0, microsecond=0)
-        buckets.setdefault(minute_dt, []).append((E, N, U, q))
+        # 1 Hz input: ~60 consecutive samples share a bucket, so test the current
+        # minute's [start, end) range and only build a floored datetime on a change
+        if last_key is None or not (last_key <= dt < last_end):
+            last_key = dt.replace(second=0, microsecond=0)
+            last_end = last_key + _MINUTE
+            Es_app, Ns_app, Us_app, Qs_app = (lst.append for lst in buckets[last_key])
+        Es_app(E); Ns_app(N); Us_app(U); Qs_app(q)
 
     out: Dict[datetime, Tuple[float,float,float,int]] = {}
-    for k, arr in buckets.items():
-        Es = [a[0] for a in arr]; Ns = [a[1] for a in arr]; Us = [a[2] for a in arr]; Qs = [a[3] for a in arr]
+    for k, (Es, Ns, Us, Qs) in buckets.items():
         if method == "median":
             aggE = float(median(Es)); aggN = float(median(Ns)); aggU = float(median(Us))
         else:
-            aggE = float(mean(Es));   aggN = float(mean(Ns));   aggU = float(mean(Us))
+            # fsum is exact like statistics.mean, without its Fraction arithmetic
+            n = len(Es)
+            aggE = math.fsum(Es) / n; aggN = math.fsum(Ns) / n; aggU = math.fsum(Us) / n
         aggQ = int(max(Qs)) if Qs else 0
         out[k] = (aggE, aggN, aggU, aggQ)
     return out
 
 # ====================== Daily I/O ===========================
 
-def _read_daily_file(path_plain_or_gz: Path) -> Dict[datetime, Tuple[float,float,float,int]]:
+def _read_daily_file(path_plain_or_gz: Path) -> Dict[str, Tuple[float,float,float,int]]:
     """
-    Read a 1-minute daily file (.RTK or .RTK.gz) into {minute_dt: (E,N,U,q)}.
+    Read a 1-minute daily file (.RTK or .RTK.gz) into {"yyyy/MM/dd HH:mm:ss": (E,N,U,q)}.
+    Timestamps stay strings: they sort chronologically and are written back as-is.
     """
     fp = path_plain_or_gz
     if not fp.exists():
@@ -199,42 +255,55 @@ def _read_daily_file(path_plain_or_gz: Path) -> Dict[datetime, Tuple[float,float
     if len(lines) <= 2:
         return {}
 
-    data: Dict[datetime, Tuple[float,float,float,int]] = {}
+    # Columns are whitespace-separated here (see _write_daily_file), not at the
+    # base-file offsets: "yyyy/MM/dd HH:mm:ss  E  N  U  Q"
+    data: Dict[str, Tuple[float,float,float,int]] = {}
     for line in lines[2:]:
-        if len(line) < 72:
+        parts = line.split()
+        if len(parts) < 5:
             continue
-        ts = line[0:19].strip()
-        es = line[24:38].strip()
-        ns = line[39:53].strip()
-        us = line[54:68].strip()
-        qs = line[71:72].strip()
-        try:
-            dt = datetime.strptime(ts, "%Y/%m/%d %H:%M:%S")
-        except Exception:
+        ts = f"{parts[0]} {parts[1]}"
+        es, ns, us = parts[2], parts[3], parts[4]
+        qs = parts[5] if len(parts) > 5 else ""
+        # our own rows are already canonical; anything else goes through the tolerant parse
+        if not (len(ts) == 19 and ts[4] == ts[7] == "/" and ts[13] == ts[16] == ":"
+                and (ts[0:4] + ts[5:7] + ts[8:10] + ts[11:13] + ts[14:16] + ts[17:19]).isdigit()):
             try:
-                y, M, d = ts[0:4], ts[5:7].lstrip("/"), ts[8:10].lstrip("/")
-                h, m, s = ts[11:13], ts[14:16], ts[17:19]
-                dt = datetime(int(y), int(M), int(d), int(h), int(m), int(s))
+                dt = datetime.strptime(ts, "%Y/%m/%d %H:%M:%S")
             except Exception:
-                continue
+                try:
+                    y, M, d = ts[0:4], ts[5:7].lstrip("/"), ts[8:10].lstrip("/")
+                    h, m, s = ts[11:13], ts[14:16], ts[17:19]
+                    dt = datetime(int(y), int(M), int(d), int(h), int(m), int(s))
+                except Exception:
+                    continue
+            ts = _ts_str(dt)
         try:
             E = float(es); N = float(ns); U = float(us); q = int(qs) if qs else 0
         except Exception:
             continue
-        data[dt] = (E, N, U, q)
+        data[ts] = (E, N, U, q)
     return data
 
-def _write_daily_file(path_plain: Path, data: Dict[datetime, Tuple[float,float,float,int]]) -> None:
+def _write_daily_file(path_plain: Path, data: Dict[str, Tuple[float,float,float,int]]) -> None:
     """
-    Overwrite plain .RTK with sorted minute rows and a minimal 2-line header.
+    Overwrite plain .RTK with sorted minute rows and a minimal 2-line header
+    (atomically, via a temp file + os.replace). The folder must exist.
     """
-    path_plain.parent.mkdir(parents=True, exist_ok=True)
-    rows = sorted(data.items(), key=lambda kv: kv[0])
-    with open(path_plain, "w", encoding="utf-8") as f:
-        f.write("# DeforMA RTK 1-minute daily file\n")
-        f.write("# time(yyyy/MM/dd HH:mm:ss)       East(m)        North(m)          Up(m)   Q\n")
-        for dt, (E, N, U, q) in rows:
-            f.write(f"{dt.strftime('%Y/%m/%d %H:%M:%S')}    {E:>13.6f}    {N:>13.6f}    {U:>13.6f}   {q:1d}\n")
+    rows = sorted(data.items())
+    out = [
+        "# DeforMA RTK 1-minute daily file\n",
+        "# time(yyyy/MM/dd HH:mm:ss)       East(m)        North(m)          Up(m)   Q\n",
+    ]
+    out.extend(
+        f"{ts}    {E:>13.6f}    {N:>13.6f}    {U:>13.6f}   {q:1d}\n"
+        for ts, (E, N, U, q) in rows
+    )
+    # Write next to the target and swap it in, so readers (web_rtk) never see a half-written day
+    tmp = path_plain.with_name(f".{path_plain.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("".join(out))  # one write for the whole day
+    os.replace(tmp, path_plain)
 
 def _gzip_if_old(path_plain: Path, days_ago: int) -> None:
     """
@@ -259,47 +328,125 @@ def _gzip_if_old(path_plain: Path, days_ago: int) -> None:
         return
 
     try:
-        with open(path_plain, "rb") as f_in, gzip.open(gz, "wb") as f_out:
+        # level 6 = gzip(1) default; level 9 costs several times the CPU for a few % smaller files
+        with open(path_plain, "rb") as f_in, gzip.open(gz, "wb", compresslevel=6) as f_out:
             shutil.copyfileobj(f_in, f_out)
         path_plain.unlink(missing_ok=True)
         _log(f"gzipped {path_plain.name} -> {gz.name}")
     except Exception as e:
         _log(f"[warn] gzip failed for {path_plain}: {e}")
 
+def _gzip_old_daily_files(day_dir: Path, days_ago: int) -> None:
+    """
+    Gzip every plain daily file in day_dir older than N days, in one directory
+    pass (days age whether or not they were rewritten this run).
+    """
+    try:
+        with os.scandir(day_dir) as it:
+            names = {e.name for e in it}
+    except FileNotFoundError:
+        return
+    for name in sorted(names):
+        if name.endswith(".RTK") and not name.startswith(".") and name + ".gz" not in names:
+            _gzip_if_old(day_dir / name, days_ago)
+
 # ====================== Core ================================
 
-def process_baseline(baseline: str, agg_method: str, gzip_days: int) -> None:
+def _missing_daily_files(day_dir: Path, names: List[str]) -> bool:
+    """True if any of `names` is in day_dir neither plain nor gzipped."""
+    if not names:
+        return False
+    try:
+        present = set(os.listdir(day_dir))
+    except OSError:
+        return True
+    return any(n not in present and f"{n}.gz" not in present for n in names)
+
+def process_baseline(baseline: str, agg_method: str, gzip_days: int, force: bool = False) -> None:
     baseline = baseline.upper().strip()
+    _update_daily_files(baseline, agg_method, force)
+    if gzip_days >= 0:
+        _gzip_old_daily_files(OUT_DAILY_ROOT / baseline, gzip_days)
+
+def _update_daily_files(baseline: str, agg_method: str, force: bool) -> None:
     base_src  = BASE_RTK_DIR / f"{baseline}.RTK"
-    base_copy = BASE_RTK_DIR / f"{baseline}.RTK_copy"
 
-    if not _safe_copy(base_src, base_copy):
-        _log(f"[info] base file missing or copy failed for {baseline}: {base_src}")
+    try:
+        st = base_src.stat()
+    except OSError:
+        _log(f"[info] base file missing for {baseline}: {base_src}")
+        return
+
+    # Same file, size + mtime + method as last run, and every daily file it fed
+    # still there -> nothing new to downsample
+    sig = {"ino": st.st_ino, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "method": agg_method}
+    state = _load_state(baseline)
+    day_dir = OUT_DAILY_ROOT / baseline
+    days = state.get("days")
+    if not isinstance(days, list):
+        days = []
+    missing = _missing_daily_files(day_dir, days)
+    if not force and not missing and all(state.get(k) == v for k, v in sig.items()):
+        _log(f"[info] {baseline}: base file unchanged since last run, skipped")
         return
 
-    samples = _parse_base_rtk(base_copy)
-    base_copy.unlink(missing_ok=True)
+    # The base file only grows, so pick up where the last run left off (its
+    # last, possibly partial, minute is re-read and re-aggregated in full).
+    # Start over if the file was replaced or truncated, the method changed (the
+    # earlier minutes were aggregated the other way) or a daily file went missing.
+    offset = state.get("offset", 0)
+    if (force or missing or state.get("ino") != st.st_ino or state.get("method") != agg_method
+            or not isinstance(offset, int) or offset > st.st_size):
+        offset = 0
+        days = []
+
+    # _parse_base_rtk reads the file in one go, which already gives us a
+    # point-in-time snapshot of the (still growing) base file.
+    samples, resume = _parse_base_rtk(base_src, offset)
+    sig["offset"] = resume
+    sig["days"] = days
 
     if not samples:
         _log(f"[info] no samples parsed for {baseline}")
+        _save_state(baseline, sig)
         return
 
     # Downsample to 1-minute
     per_min = _downsample_1min(samples, method=agg_method)
 
-    # Group per day and write to workpool daily area
+    # Group per day once, so each daily file is read/merged/written a single time
+    per_day: Dict[date, Dict[datetime, Tuple[float,float,float,int]]] = {}
     for minute_dt, tup in per_min.items():
-        day_dir   = OUT_DAILY_ROOT / baseline
-        day_file  = day_dir / _daily_file_name(baseline, minute_dt)
+        per_day.setdefault(minute_dt.date(), {})[minute_dt] = tup
+
+    day_dir.mkdir(parents=True, exist_ok=True)  # once per baseline, not per daily file
+    for minutes in per_day.values():
+        first, last = min(minutes), max(minutes)
+        day_file = day_dir / _daily_file_name(baseline, first)
 
         # Load existing data (plain or gz)
         current = _read_daily_file(day_file)
-        current[minute_dt] = tup  # overwrite/insert this minute
+        current.update((_ts_str(dt), tup) for dt, tup in minutes.items())  # overwrite/insert these minutes
         _write_daily_file(day_file, current)
-        _log(f"{baseline}: updated {day_file.name} (minute {minute_dt.strftime('%Y-%m-%d %H:%M')})")
+        if day_file.name not in days:
+            days.append(day_file.name)
+        _log(f"{baseline}: updated {day_file.name} ({len(minutes)} minutes, "
+             f"{first.strftime('%Y-%m-%d %H:%M')} -> {last.strftime('%H:%M')})")
 
-        if gzip_days >= 0:
-            _gzip_if_old(day_file, gzip_days)
+    _save_state(baseline, sig)
+
+def _run_baseline(baseline: str, agg_method: str, gzip_days: int, force: bool) -> List[str]:
+    """
+    Run one baseline and return (and drain) the buffered log lines, so pool
+    workers can hand them back to the parent, which owns the log file.
+    """
+    try:
+        process_baseline(baseline, agg_method=agg_method, gzip_days=gzip_days, force=force)
+    except Exception as e:
+        _log(f"[error] baseline {baseline}: {e}")
+    lines = _LOG_BUF[:]
+    _LOG_BUF.clear()
+    return lines
 
 # ====================== CLI ================================
 
@@ -308,14 +455,18 @@ def main():
     parser.add_argument("--baselines", default="", help="Comma-separated list (override baselines.yaml)")
     parser.add_argument("--method", choices=["mean", "median"], default="mean", help="Downsample method (default: mean)")
     parser.add_argument("--gzip-days", type=int, default=2, help="Gzip daily files older than N days (default: 2). Use -1 to disable.")
+    parser.add_argument("--force", action="store_true", help="Reprocess base files even if unchanged since the last run")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Baselines processed in parallel (default: 1 = serial; 0 = CPU count, for backfills/--force)")
     args = parser.parse_args()
 
+    atexit.register(_flush_log)  # keep buffered lines even on an unexpected exit
     _log("=== alert_rtk run ===")
     _log(f"BASE_RTK_DIR     = {BASE_RTK_DIR}")
     _log(f"WORKPOOL_DIR     = {WORKPOOL_DIR}")
     _log(f"OUT_DAILY_ROOT   = {OUT_DAILY_ROOT}")
     _log(f"BASELINES_YAML   = {BASELINES_YAML}")
-    _log(f"method={args.method} gzip_days={args.gzip_days}")
+    _log(f"method={args.method} gzip_days={args.gzip_days} jobs={args.jobs or 'auto'}")
 
     OUT_DAILY_ROOT.mkdir(parents=True, exist_ok=True)
 
@@ -330,13 +481,26 @@ def main():
         _log("=== alert_rtk done ===")
         return
 
-    for b in baselines:
-        try:
-            process_baseline(b, agg_method=args.method, gzip_days=args.gzip_days)
-        except Exception as e:
-            _log(f"[error] baseline {b}: {e}")
+    # Baselines are independent (own base file, daily dir and state file);
+    # parsing is CPU-bound, so spread them over processes.
+    jobs = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(baselines))
+    if jobs > 1:
+        _flush_log()  # nothing pending may be inherited by the workers
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            futures = [ex.submit(_run_baseline, b, args.method, args.gzip_days, args.force) for b in baselines]
+            for b, fut in zip(baselines, futures):
+                try:
+                    _LOG_BUF.extend(fut.result())
+                except Exception as e:
+                    _log(f"[error] baseline {b}: {e}")
+                _flush_log()
+    else:
+        for b in baselines:
+            _LOG_BUF.extend(_run_baseline(b, args.method, args.gzip_days, args.force))
+            _flush_log()
 
     _log("=== alert_rtk done ===")
+    _flush_log()
 
 if __name__ == "__main__":
     main()
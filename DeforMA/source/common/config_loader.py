@@ -52,6 +52,9 @@ def _deep_expand(data, ctx: dict):
         return _expand_placeholders(data, ctx)
     return data
 
+# libyaml-backed loader when PyYAML was built with it (same safe subset, C speed)
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 # -----------------------------
 # Dataclass for resolved config
 # -----------------------------
@@ -138,7 +141,7 @@ def load_config(config_path: Optional[str] = None) -> Config:
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
     with open(config_path, "r", encoding="utf-8") as f:
-        raw = yaml.safe_load(f) or {}
+        raw = yaml.load(f, Loader=_SafeLoader) or {}
 
     # Phase 1: resolve 'main'
     main = raw.get("main", "/opt/DeforMA")
@@ -157,18 +160,21 @@ def load_config(config_path: Optional[str] = None) -> Config:
     }
 
     # Phase 2: expand each block using dotted placeholders
+    # (dependency order: files refers to user_workspace.*, so it comes after it)
     paths          = _deep_expand(raw.get("paths", {}), ctx)
     ctx["paths"]   = paths
     externals      = _deep_expand(raw.get("externals", {}), ctx)
     ctx["externals"]= externals
-    files          = _deep_expand(raw.get("files", {}), ctx)
-    ctx["files"]   = files
     database       = _deep_expand(raw.get("database", {}), ctx)
     ctx["database"]= database
     user_ws        = _deep_expand(raw.get("user_workspace", {}), ctx)
     ctx["user_workspace"] = user_ws
+    files          = _deep_expand(raw.get("files", {}), ctx)
+    ctx["files"]   = files
     ftp            = _deep_expand(raw.get("ftp", {}), ctx)
+    ctx["ftp"]     = ftp
     options        = _deep_expand(raw.get("options", {}), ctx)
+    ctx["options"] = options
 
     # Handy resolved fields with defaults
     user_db = user_ws.get("database") or os.path.join(os.path.expanduser("~"), "DeforMA", "database", "DeforMA.user.db")
@@ -201,6 +207,7 @@ def load_config(config_path: Optional[str] = None) -> Config:
         sinex_frames=list(frames),
         sinex_sol_dir=sol_dir,
         sinex_sol_pattern=pattern,
-        raw=_deep_expand(raw, ctx),
+        # sections are already resolved in ctx; only expand the remaining top-level keys
+        raw={k: ctx[k] if k in ctx else _deep_expand(v, ctx) for k, v in raw.items()},
     )
 
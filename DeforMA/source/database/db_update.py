@@ -15,7 +15,9 @@ Usage:
 """
 
 from __future__ import annotations
-import argparse, gzip, io, math, re, sqlite3, sys
+import argparse, atexit, gzip, io, math, os, re, sqlite3, sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Tuple, Optional, List
@@ -38,11 +40,20 @@ except Exception as e:
 
 
 # ---------- Logging ----------
+_LOG_FH: Dict[Path, io.TextIOBase] = {}   # one buffered append handle per log file
+
 def _log(msg: str, logfile: Path) -> None:
-    logfile.parent.mkdir(parents=True, exist_ok=True)
+    f = _LOG_FH.get(logfile)
+    if f is None:
+        logfile.parent.mkdir(parents=True, exist_ok=True)
+        f = _LOG_FH[logfile] = open(logfile, "a", encoding="utf-8", buffering=1 << 17)
     ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    with open(logfile, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {msg.rstrip()}\n")
+    f.write(f"[{ts}] {msg.rstrip()}\n")
+
+
+def _close_logs() -> None:
+    while _LOG_FH:
+        _LOG_FH.popitem()[1].close()
 
 
 # ---------- SQL ----------
@@ -68,6 +79,22 @@ def create_ts_table(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
+def ensure_ts_index(conn: sqlite3.Connection) -> None:
+    """Index in export order, so db_view's ORDER BY station, reference_frame, date
+    is an index scan instead of a temp B-tree sort. Key columns only: it is updated
+    on every INSERT OR REPLACE, so it should stay small."""
+    # earlier builds made this a covering index over all nine columns
+    if len(conn.execute("PRAGMA index_info(ix_ts_station_frame_date)").fetchall()) > 3:
+        conn.execute("DROP INDEX ix_ts_station_frame_date")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_ts_station_frame_date
+            ON time_series (station, reference_frame, date);
+        """
+    )
+    conn.commit()
+
+
 # ---------- SINEX parsing ----------
 _EST_BLOCK_START = re.compile(r'^\s*\+SOLUTION/ESTIMATE', re.I)
 _EST_BLOCK_END   = re.compile(r'^\s*\-SOLUTION/ESTIMATE', re.I)
@@ -84,6 +111,7 @@ def _open_text_any(path: Path) -> io.TextIOBase:
         return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="ignore")
     return open(path, "r", encoding="utf-8", errors="ignore")
 
+@lru_cache(maxsize=1024)  # a SINEX file repeats the same few epochs on every STAX/STAY/STAZ line
 def _epoch_to_date(yy_doy_sec: str, year_hint: Optional[int]) -> str:
     yy_s, doy_s, sec_s = yy_doy_sec.split(':')
     yy, doy, sec = int(yy_s), int(doy_s), int(sec_s)
@@ -99,14 +127,16 @@ def parse_sinex_xyz(path: Path, year_hint: Optional[int]) -> Dict[Tuple[str, str
     in_block = False
     with _open_text_any(path) as f:
         for line in f:
+            # Cheap substring tests gate the regexes: block markers always contain "/",
+            # and only STAX/STAY/STAZ rows can match _SNX_EST_LINE.
             if not in_block:
-                if _EST_BLOCK_START.match(line):
+                if "/" in line and _EST_BLOCK_START.match(line):
                     in_block = True
                 continue
-            if _EST_BLOCK_END.match(line):
-                break
-            m = _SNX_EST_LINE.match(line)
+            m = _SNX_EST_LINE.match(line) if "STA" in line else None
             if not m:
+                if "/" in line and _EST_BLOCK_END.match(line):
+                    break
                 continue
             ptype, sta, epoch, val_s = m.groups()
             try:
@@ -126,18 +156,20 @@ def parse_sinex_xyz(path: Path, year_hint: Optional[int]) -> Dict[Tuple[str, str
 
 
 # ---------- Coordinate transform XYZ → NEU ----------
-def xyz_to_neu(x: float, y: float, z: float) -> Tuple[float, float, float]:
-    """Convert ECEF to NEU (approximate, using reference WGS84)."""
-    # WGS84 constants
-    a = 6378137.0
-    e2 = 6.69437999014e-3
+# WGS84 constants
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+_ONE_MINUS_E2 = 1 - _WGS84_E2
 
+def xyz_to_neu(x: float, y: float, z: float) -> Tuple[float, float, float]:
+    """Convert ECEF to NEU (approximate, using reference WGS84). Closed form, no iteration."""
     lon = math.atan2(y, x)
     p = math.sqrt(x**2 + y**2)
-    lat = math.atan2(z, p * (1 - e2))
-    N = a / math.sqrt(1 - e2 * math.sin(lat)**2)
+    lat = math.atan2(z, p * _ONE_MINUS_E2)
+    sin_lat = math.sin(lat)
+    N = _WGS84_A / math.sqrt(1 - _WGS84_E2 * sin_lat**2)
     h = p / math.cos(lat) - N
-    n = N * math.sin(lat)
+    n = N * sin_lat
     e = lon * 180 / math.pi
     u = h
     return n, e, u
@@ -146,45 +178,72 @@ def xyz_to_neu(x: float, y: float, z: float) -> Tuple[float, float, float]:
 # ---------- Importer ----------
 def import_sinex_into_db(conn: sqlite3.Connection, snx_file: Path, frame: str, year_hint: Optional[int]) -> int:
     xyz_map = parse_sinex_xyz(snx_file, year_hint=year_hint)
+    return insert_xyz_into_db(conn, xyz_map, frame=frame)
+
+
+def insert_xyz_into_db(conn: sqlite3.Connection, xyz_map: Dict[Tuple[str, str], Tuple[float, float, float]], frame: str) -> int:
     if not xyz_map:
         return 0
 
-    cur = conn.cursor()
-    n = 0
-    for (sta, date_str), (x, y, z) in xyz_map.items():
-        n_val, e_val, u_val = xyz_to_neu(x, y, z)
-        cur.execute(
-            """
-            INSERT OR REPLACE INTO time_series
-                (station, date, reference_frame, x, y, z, n, e, u)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (sta, date_str, frame, x, y, z, n_val, e_val, u_val),
-        )
-        n += 1
+    rows = [
+        (sta, date_str, frame, x, y, z, *xyz_to_neu(x, y, z))
+        for (sta, date_str), (x, y, z) in xyz_map.items()
+    ]
+    # one prepared statement for the whole file
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO time_series
+            (station, date, reference_frame, x, y, z, n, e, u)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
     conn.commit()
-    return n
+    return len(rows)
 
 
 # ---------- File discovery ----------
+def _scan_sinex_dir(base: Path) -> list[Path]:
+    """One directory read, case-insensitive on .snx / .snx.gz (plain files first)."""
+    plain: list[Path] = []
+    packed: list[Path] = []
+    try:
+        it = os.scandir(base)
+    except FileNotFoundError:
+        return []
+    with it:
+        for entry in it:
+            name = entry.name.lower()
+            if name.endswith(".snx"):
+                bucket = plain
+            elif name.endswith(".snx.gz"):
+                bucket = packed
+            else:
+                continue
+            if entry.is_file():
+                bucket.append(Path(entry.path))
+    return plain + packed
+
+def _list_subdirs(parent: Path) -> list[Path]:
+    """Sub-folders of parent, typed from the scandir entries (no stat per child)."""
+    with os.scandir(parent) as it:
+        return [Path(e.path) for e in it if e.is_dir()]
+
 def discover_sinex_files(root: Path, frames: Optional[list[str]] = None, years: Optional[list[int]] = None) -> list[tuple[str, int | None, Path]]:
     results: list[tuple[str, int | None, Path]] = []
     if not root.exists():
         return results
-    frame_dirs = [root / f for f in frames] if frames else [p for p in root.iterdir() if p.is_dir()]
+    frame_dirs = [root / f for f in frames if (root / f).is_dir()] if frames else _list_subdirs(root)
     for fdir in frame_dirs:
-        if not fdir.is_dir():
-            continue
         frame = fdir.name
-        year_dirs = [fdir / str(y) for y in years] if years else [p for p in fdir.iterdir() if p.is_dir() and p.name.isdigit()]
+        year_dirs = [fdir / str(y) for y in years] if years else [p for p in _list_subdirs(fdir) if p.name.isdigit()]
         for ydir in year_dirs:
             year_hint = int(ydir.name) if ydir.name.isdigit() else None
             sol_dir = ydir / "SOL"
             dirs = [sol_dir] if sol_dir.is_dir() else [ydir]
             for base in dirs:
-                for pat in ("*.SNX", "*.snx", "*.SNX.gz", "*.snx.gz"):
-                    for fp in base.glob(pat):
-                        results.append((frame, year_hint, fp))
+                for fp in _scan_sinex_dir(base):
+                    results.append((frame, year_hint, fp))
     return results
 
 
@@ -193,7 +252,9 @@ def main():
     parser = argparse.ArgumentParser(description="Populate DeforMA user-level DB (XYZ + NEU).")
     parser.add_argument("--config", default="/opt/DeforMA/configuration/config.yaml", help="Path to config.yaml")
     parser.add_argument("--reset", action="store_true", help="Drop & recreate the table before import")
+    parser.add_argument("--jobs", type=int, default=0, help="SINEX parser processes (default: CPU count, 1 = serial)")
     args = parser.parse_args()
+    atexit.register(_close_logs)  # flush the log handle on any exit path
 
     cfg = load_config(args.config)
     user_db = Path(cfg.user_workspace.database).expanduser()
@@ -225,19 +286,38 @@ def main():
     else:
         _log("Updating existing database...", log_path)
 
-    total_rows = 0
-    for frame, year_hint, fp in files:
-        try:
-            rows = import_sinex_into_db(conn, fp, frame=frame, year_hint=year_hint)
-            total_rows += rows
-        except Exception as e:
-            _log(f"[warn] import failed for {fp}: {e}", log_path)
-            print(f"[warn] import failed for {fp}: {e}")
+    # Parsing is CPU-bound and independent per file -> process pool.
+    # Inserts stay in this process, in discovery order, so REPLACE semantics are unchanged.
+    workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), max(len(files), 1))
+    _log(f"Workers     : {workers}", log_path)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
 
+    total_rows = 0
+    try:
+        pending = [pool.submit(parse_sinex_xyz, fp, year_hint) if pool else None for _, year_hint, fp in files]
+        for (frame, year_hint, fp), fut in zip(files, pending):
+            try:
+                xyz_map = fut.result() if fut else parse_sinex_xyz(fp, year_hint=year_hint)
+                rows = insert_xyz_into_db(conn, xyz_map, frame=frame)
+                total_rows += rows
+            except Exception as e:
+                _log(f"[warn] import failed for {fp}: {e}", log_path)
+                print(f"[warn] import failed for {fp}: {e}")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    # created once the table is filled (first run or after --reset); later runs
+    # find it in place and it is updated with each replaced row
+    try:
+        ensure_ts_index(conn)
+    except sqlite3.Error as e:
+        _log(f"[warn] cannot create time_series index: {e}", log_path)
     conn.close()
     _log(f"Files processed: {len(files)}", log_path)
     _log(f"Rows imported  : {total_rows}", log_path)
     _log("=== db_update completed ===\n", log_path)
+    _close_logs()
     print(f"Files processed: {len(files)}")
     print(f"Rows imported  : {total_rows}")
     print("Done.")
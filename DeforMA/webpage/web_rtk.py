@@ -18,12 +18,15 @@ DeforMA - RTK Web Viewer (Flask)
 """
 
 from __future__ import annotations
-import io
 import os
 import gzip
 import csv
+import hashlib
 import json
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from typing import List, Tuple, Dict
 
@@ -42,63 +45,103 @@ HOME = Path.home()
 METADATA_YAML = HOME / "DeforMA" / "metadata" / "baselines.yaml"
 RTK_DAILY_DIR = HOME / "DeforMA" / "workpool" / "alert_rtk" / "daily"
 
+# Shared pool for reading the daily files of a multi-day window
+_READ_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rtk-read")
+
 print(f"[info] RTK_DAILY_DIR = {RTK_DAILY_DIR}")
 print(f"[info] baselines.yaml = {METADATA_YAML}")
 
 # ---------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------
-def _yydoy(dt: datetime) -> str:
-    return f"{dt.year % 100:02d}{dt.timetuple().tm_yday:03d}"
+# A series is kept as parallel columns (t, E, N, U, Q) rather than one tuple per
+# record: t are "yyyy-MM-dd HH:mm:ss" strings, Q are ints
+Columns = Tuple[List[str], List[float], List[float], List[float], List[int]]
+
+def _yydoy_range(first: date, last: date) -> List[str]:
+    """
+    YYDOY strings for every day first..last inclusive, walked by ordinal:
+    only a year change builds a new date object.
+    """
+    out: List[str] = []
+    o, end = first.toordinal(), last.toordinal()
+    while o <= end:
+        year = date.fromordinal(o).year
+        jan1 = date(year, 1, 1).toordinal()
+        stop = min(end, date(year, 12, 31).toordinal())
+        yy = f"{year % 100:02d}"
+        out.extend(f"{yy}{d - jan1 + 1:03d}" for d in range(o, stop + 1))
+        o = stop + 1
+    return out
 
-def _candidate_paths(daily_dir: Path, base: str, yydoy: str) -> List[Path]:
+def _candidate_patterns(daily_dir: Path, base: str) -> List[Tuple[Path, str]]:
     """
-    Return all filename patterns we accept, in priority order.
+    Return all (folder, filename pattern) pairs we accept, in priority order.
+    Patterns take the day as {y}, e.g. "{y}.RTK" -> "25288.RTK".
     """
     b = base
+    base_dir = daily_dir / b
     candidates = [
-        daily_dir / b / f"{yydoy}.RTK",
-        daily_dir / b / f"{yydoy}.RTK.gz",
-        daily_dir / b / f"{b}_{yydoy}.RTK",      # <-- your current layout
-        daily_dir / b / f"{b}_{yydoy}.RTK.gz",
-        daily_dir / f"{b}_{yydoy}.RTK",          # at root
-        daily_dir / f"{b}_{yydoy}.RTK.gz",
-        daily_dir / f"{yydoy}.RTK",              # plain yydoy at root (fallback)
-        daily_dir / f"{yydoy}.RTK.gz",
+        (base_dir, "{y}.RTK"),
+        (base_dir, "{y}.RTK.gz"),
+        (base_dir, f"{b}_{{y}}.RTK"),            # <-- your current layout
+        (base_dir, f"{b}_{{y}}.RTK.gz"),
+        (daily_dir, f"{b}_{{y}}.RTK"),           # at root
+        (daily_dir, f"{b}_{{y}}.RTK.gz"),
+        (daily_dir, "{y}.RTK"),                  # plain yydoy at root (fallback)
+        (daily_dir, "{y}.RTK.gz"),
     ]
     return candidates
 
-def _open_text(path: Path):
+def _read_text(path: Path) -> str:
+    """
+    Whole file (plain or .gz) in one read + one decode, instead of line-by-line I/O.
+    """
+    data = path.read_bytes()
     if str(path).lower().endswith(".gz"):
-        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="ignore")
-    return open(path, "r", encoding="utf-8", errors="ignore")
+        data = gzip.decompress(data)
+    return data.decode("utf-8", errors="ignore")
 
-def _read_daily_file(path: Path) -> List[Tuple[str, float, float, float, int]]:
+def _read_daily_file(path: Path) -> Columns:
     """
     Parse daily RTK file lines like:
       # time(yyyy/MM/dd HH:mm:ss) East(m) North(m) Up(m) Q
       2025/10/15 12:47:00 -329.224850 9111.198600 -88.149300 0
-    Returns list of (iso_time, E, N, U, Q).
+    Returns columns (iso_times, E, N, U, Q).
     """
-    out = []
-    with _open_text(path) as f:
-        for raw in f:
-            line = raw.strip()
-            if not line or line.startswith("#"):
-                continue
-            parts = line.split()
-            # Expect: date, time, E, N, U, [Q]
-            if len(parts) < 5:
-                continue
-            ts = f"{parts[0]} {parts[1]}"
-            try:
-                dt = datetime.strptime(ts, "%Y/%m/%d %H:%M:%S")
-                E = float(parts[2]); N = float(parts[3]); U = float(parts[4])
-                Q = int(parts[5]) if len(parts) > 5 and parts[5].isdigit() else 0
-                out.append((dt.isoformat(sep=" "), E, N, U, Q))
-            except Exception:
-                continue
-    return out
+    ts: List[str] = []; es: List[float] = []; ns: List[float] = []; us: List[float] = []; qs: List[int] = []
+    for raw in _read_text(path).splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        # Expect: date, time, E, N, U, [Q]
+        if len(parts) < 5:
+            continue
+        d, t = parts[0], parts[1]
+        try:
+            # canonical "yyyy/MM/dd HH:mm:ss" -> ISO by string surgery, no datetime round-trip
+            if (len(d) == 10 and len(t) == 8 and d[4] == d[7] == "/" and t[2] == t[5] == ":"
+                    and (d[0:4] + d[5:7] + d[8:10] + t[0:2] + t[3:5] + t[6:8]).isdigit()):
+                iso = f"{d[0:4]}-{d[5:7]}-{d[8:10]} {t}"
+            else:
+                iso = datetime.strptime(f"{d} {t}", "%Y/%m/%d %H:%M:%S").isoformat(sep=" ")
+            E = float(parts[2]); N = float(parts[3]); U = float(parts[4])
+            Q = int(parts[5]) if len(parts) > 5 and parts[5].isdigit() else 0
+        except Exception:
+            continue
+        ts.append(iso); es.append(E); ns.append(N); us.append(U); qs.append(Q)
+    return ts, es, ns, us, qs
+
+@lru_cache(maxsize=256)
+def _read_daily_cached(path_str: str, mtime_ns: int, size: int) -> Tuple[tuple, ...]:
+    # mtime/size are part of the key: a rewritten day is parsed again, finished days only once.
+    # Columns are frozen to tuples so callers cannot alter the cached copy.
+    return tuple(tuple(col) for col in _read_daily_file(Path(path_str)))
+
+def _file_sig(path: Path) -> Tuple[str, int, int]:
+    st = path.stat()
+    return str(path), st.st_mtime_ns, st.st_size
 
 def _list_files_for_window(daily_dir: Path, base: str, window_alias: str) -> List[Path]:
     """
@@ -113,82 +156,153 @@ def _list_files_for_window(daily_dir: Path, base: str, window_alias: str) -> Lis
     elif window_alias == "month": start = now - timedelta(days=30)
     else:                         start = now - timedelta(days=1)   # 24h rolling
 
+    # One listing per folder a candidate can live in, then the per-day probes are
+    # set lookups instead of up to 8 stat() calls per day
+    patterns = _candidate_patterns(daily_dir, base)
+    listing: Dict[Path, set] = {}
+    for d in (daily_dir / base, daily_dir):
+        try:
+            with os.scandir(d) as it:
+                listing[d] = {e.name for e in it}
+        except OSError:
+            listing[d] = set()
+
     # Iterate full days from start.date() to now.date(), inclusive
-    day = datetime(start.year, start.month, start.day)
-    end_day = datetime(now.year, now.month, now.day)
     files: List[Path] = []
 
-    while day <= end_day:
-        yydoy = _yydoy(day)
+    for yydoy in _yydoy_range(start.date(), now.date()):
         found = None
-        for p in _candidate_paths(daily_dir, base, yydoy):
-            if p.exists():
-                found = p
+        for folder, pat in patterns:
+            name = pat.format(y=yydoy)
+            if name in listing[folder]:
+                found = folder / name
                 break
         if found:
             files.append(found)
-        day += timedelta(days=1)
 
     return sorted(files)
 
-def _downsample(records: List[Tuple[str, float, float, float, int]], rate: str
-               ) -> List[Tuple[str, float, float, float, int]]:
+# Floored bin key straight from the "yyyy-MM-dd HH:mm:ss" string: keep the first
+# `cut` chars and pad, e.g. 10min: "2025-10-15 12:47:31" -> "2025-10-15 12:40:00"
+_RATE_BIN = {
+    "1min":  (16, ":00"),
+    "10min": (15, "0:00"),
+    "1hour": (13, ":00:00"),
+}
+
+def _downsample(cols: Columns, rate: str) -> Columns:
     """
     Aggregate by floored timestamp to:
       - 1min   -> return as-is (but still deduplicate within a minute)
       - 10min  -> average per 10-minute bin
       - 1hour  -> average per 1-hour bin
     """
-    if not records:
-        return []
-
-    def _floor_dt(dt: datetime, minutes: int) -> datetime:
-        m = (dt.minute // minutes) * minutes
-        return dt.replace(second=0, microsecond=0, minute=m)
+    if not cols[0]:
+        return [], [], [], [], []
+
+    cut, fill = _RATE_BIN.get(rate, _RATE_BIN["1min"])
+
+    # alert_rtk writes one sample per whole minute, so at 1min every bin would hold a
+    # single record: if stamps are on :00 and strictly increasing, skip the binning
+    t, e, n, u, q = cols
+    if (cut == 16 and all(s[16:] == ":00" for s in t)
+            and not any(a >= b for a, b in zip(t, islice(t, 1, None)))):
+        # 0.0 + v as in the bin sums (turns -0.0 into 0.0)
+        return list(t), [0.0 + v for v in e], [0.0 + v for v in n], [0.0 + v for v in u], list(q)
+
+    # running [sumE, sumN, sumU, count, maxQ] per bin; no per-bin lists of samples
+    # (sums start at 0.0 and add in record order, exactly like sum() did)
+    out: Dict[str, list] = {}
+
+    for iso, E, N, U, Q in zip(*cols):
+        key = iso[:cut] + fill
+        acc = out.get(key)
+        if acc is None:
+            out[key] = [0.0 + E, 0.0 + N, 0.0 + U, 1, Q]
+        else:
+            acc[0] += E; acc[1] += N; acc[2] += U; acc[3] += 1
+            if Q > acc[4]:
+                acc[4] = Q  # take worst (max) Q in the bin
 
-    out: Dict[str, List[Tuple[float, float, float, int]]] = {}
+    # average per bin
+    ts = sorted(out.keys())
+    es: List[float] = []; ns: List[float] = []; us: List[float] = []; qs: List[int] = []
+    for key in ts:
+        sE, sN, sU, n, Q = out[key]
+        es.append(sE / n); ns.append(sN / n); us.append(sU / n); qs.append(Q)
+    return ts, es, ns, us, qs
+
+@lru_cache(maxsize=768)
+def _day_segment(path_str: str, mtime_ns: int, size: int, rate: str) -> Tuple[bool, Tuple[tuple, ...]]:
+    """
+    One daily file parsed and downsampled to `rate`, keyed like _read_daily_cached,
+    so a finished day is binned once per rate. Returns (in_order, columns):
+    in_order is False when the file's own stamps are not strictly increasing.
+    """
+    t, e, n, u, q = _read_daily_cached(path_str, mtime_ns, size)
+    in_order = not any(a >= b for a, b in zip(t, islice(t, 1, None)))
+    cols = _downsample((list(t), list(e), list(n), list(u), list(q)), rate)
+    return in_order, tuple(tuple(col) for col in cols)
 
-    for iso, E, N, U, Q in records:
-        dt = datetime.fromisoformat(iso)
-        if rate == "1hour":
-            key_dt = _floor_dt(dt.replace(minute=0), 60)
-        elif rate == "10min":
-            key_dt = _floor_dt(dt, 10)
-        else:
-            key_dt = _floor_dt(dt, 1)
+def _join_segments(segs: List[Tuple[bool, Tuple[tuple, ...]]]) -> Columns | None:
+    """
+    Concatenate per-day segments when that equals binning the merged series:
+    every file in order and each segment's bins strictly after the previous
+    one's (no shared bin, nothing to sort or de-duplicate). Else None.
+    """
+    t: List[str] = []; e: List[float] = []; n: List[float] = []; u: List[float] = []; q: List[int] = []
+    for in_order, (st, se, sn, su, sq) in segs:
+        if not in_order:
+            return None
+        if not st:
+            continue
+        if t and t[-1] >= st[0]:
+            return None
+        t += st; e += se; n += sn; u += su; q += sq
+    return t, e, n, u, q
+
+def _merge_and_downsample(sigs: List[Tuple[str, int, int]], rate: str) -> Columns:
+    """
+    General path: merge the raw files, sort + de-duplicate by timestamp, then bin.
+    """
+    # read & merge (files in parallel: read + gunzip release the GIL; map keeps the order)
+    t: List[str] = []; e: List[float] = []; n: List[float] = []; u: List[float] = []; q: List[int] = []
+    pmap = _READ_POOL.map if len(sigs) > 1 else map
+    for pt, pe, pn, pu, pq in pmap(_read_daily_cached, *zip(*sigs)):
+        t += pt; e += pe; n += pn; u += pu; q += pq
+
+    # sort & unique (by timestamp). Files are in time order and hold distinct
+    # minutes, so the usual case is already strictly increasing: nothing to do.
+    if any(a >= b for a, b in zip(t, islice(t, 1, None))):
+        order = sorted(range(len(t)), key=t.__getitem__)  # stable
+        # drop duplicates keeping last: after the sort they are adjacent
+        keep: List[int] = []
+        for i in order:
+            if keep and t[keep[-1]] == t[i]:
+                keep[-1] = i
+            else:
+                keep.append(i)
+        t, e, n, u, q = ([col[i] for i in keep] for col in (t, e, n, u, q))
 
-        key = key_dt.isoformat(sep=" ")
-        out.setdefault(key, []).append((E, N, U, Q))
+    # downsample to requested rate
+    return _downsample((t, e, n, u, q), rate)
 
-    # average per bin
-    agg = []
-    for key in sorted(out.keys()):
-        bucket = out[key]
-        n = len(bucket)
-        E = sum(b[0] for b in bucket) / n
-        N = sum(b[1] for b in bucket) / n
-        U = sum(b[2] for b in bucket) / n
-        # take worst (max) Q in the bin
-        Q = max(b[3] for b in bucket)
-        agg.append((key, E, N, U, Q))
-    return agg
-
-def _normalize_to_first(records: List[Tuple[str, float, float, float, int]]
-                       ) -> List[Tuple[str, float, float, float, int]]:
+def _normalize_to_first(cols: Columns) -> Columns:
     """
     Shift E,N,U so the first sample is zero.
     """
-    if not records:
-        return []
-    _, e0, n0, u0, _ = records[0]
-    out = []
-    for (t, e, n, u, q) in records:
-        out.append((t, e - e0, n - n0, u - u0, q))
-    return out
+    t, e, n, u, q = cols
+    if not t:
+        return cols
+    e0, n0, u0 = e[0], n[0], u[0]
+    return t, [v - e0 for v in e], [v - n0 for v in n], [v - u0 for v in u], q
 
 # ---------------------------------------------------------------------
 # Baselines loader
 # ---------------------------------------------------------------------
+# Last parse as ((mtime_ns, size), baselines); re-read only when the file changes
+_baselines_cache: Tuple[Tuple[int, int], List[str]] | None = None
+
 def load_baselines() -> List[str]:
     """
     baselines.yaml example:
@@ -201,11 +315,19 @@ def load_baselines() -> List[str]:
         - ALTA-SBAR
     Returns a flat unique list in YAML order.
     """
-    if not METADATA_YAML.exists():
+    global _baselines_cache
+    try:
+        st = METADATA_YAML.stat()
+    except OSError:
         return []
+    sig = (st.st_mtime_ns, st.st_size)
+    if _baselines_cache is not None and _baselines_cache[0] == sig:
+        return list(_baselines_cache[1])
+
     try:
         import yaml
-        data = yaml.safe_load(METADATA_YAML.read_text(encoding="utf-8")) or {}
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)   # libyaml when available
+        data = yaml.load(METADATA_YAML.read_text(encoding="utf-8"), Loader=loader) or {}
     except Exception:
         return []
 
@@ -222,7 +344,8 @@ def load_baselines() -> List[str]:
     # de-duplicate preserving order
     seen = set()
     out = [b for b in order if not (b in seen or seen.add(b))]
-    return out
+    _baselines_cache = (sig, out)
+    return list(out)
 
 # ---------------------------------------------------------------------
 # Routes
@@ -264,33 +387,43 @@ def api_series():
         print(f"[info] no files for {baseline} in window {window}")
         return jsonify({"t": [], "e": [], "n": [], "u": [], "q": []})
 
-    # read & merge
-    recs: List[Tuple[str, float, float, float, int]] = []
-    for p in files:
-        recs.extend(_read_daily_file(p))
-    # sort & unique (by timestamp)
-    recs.sort(key=lambda r: r[0])
-    # drop duplicates keeping last
-    dedup: Dict[str, Tuple[str, float, float, float, int]] = {}
-    for r in recs:
-        dedup[r[0]] = r
-    recs = [dedup[k] for k in sorted(dedup.keys())]
-
-    # downsample to requested rate
-    recs = _downsample(recs, rate)
+    # One stat per file: keys the parse cache and the response ETag. The client's
+    # copy is still good when neither the query nor any file changed.
+    sigs = [_file_sig(p) for p in files]
+    h = hashlib.blake2b(f"{baseline}|{window}|{rate}|{norm}".encode(), digest_size=16)
+    for sig in sigs:
+        h.update("|{}:{}:{}".format(*sig).encode())
+    etag = h.hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag, weak=True)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    # usual case: glue the cached per-day segments (files in parallel, map keeps the order)
+    pmap = _READ_POOL.map if len(sigs) > 1 else map
+    cols = _join_segments(list(pmap(_day_segment, *zip(*sigs), [rate] * len(sigs))))
+    if cols is None:
+        cols = _merge_and_downsample(sigs, rate)
 
     # normalize (first to zero) by default
     if norm in {"1", "true", "yes"}:
-        recs = _normalize_to_first(recs)
-
-    # build JSON arrays
-    t = [r[0] for r in recs]
-    e = [r[1] for r in recs]
-    n = [r[2] for r in recs]
-    u = [r[3] for r in recs]
-    q = [r[4] for r in recs]
-
-    return jsonify({"t": t, "e": e, "n": n, "u": u, "q": q})
+        cols = _normalize_to_first(cols)
+
+    # columns go straight into the JSON arrays
+    t, e, n, u, q = cols
+    resp = jsonify({"t": t, "e": e, "n": n, "u": u, "q": q})
+    resp.set_etag(etag, weak=True)  # weak: same value for the plain and gzipped body
+    # no-cache: the browser keeps the body but revalidates on every fetch, so Refresh
+    # right after an alert_rtk rewrite gets fresh data (unchanged data costs a 304)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    # the JSON is mostly repeated timestamps/digits: gzip shrinks it several times over
+    body = resp.get_data()
+    if request.accept_encodings["gzip"] and len(body) >= 1024:
+        resp.set_data(gzip.compress(body, compresslevel=6))
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
 
 # ---------------------------------------------------------------------
 # Main